@@ -1,20 +1,34 @@
 """Streamlit OCR app with fine-tuning options and reports."""
 from __future__ import annotations
 
+import functools
 import io
+import itertools
 import logging
+import multiprocessing
 import os
+import queue
+import re
+import shutil
+import sys
 import tempfile
+import threading
 import time
-from typing import Any, Dict, List
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
 
 import numpy as np
 import streamlit as st
-from PIL import Image, ImageDraw
 
-import easyocr
+import ocr_worker
+from ocr_worker import PageInput
 
-import layout_heuristics as heur
+if TYPE_CHECKING:
+    from PIL import Image
+
+T = TypeVar("T")
 
 
 # ---------------------------------------------------------------------------
@@ -27,6 +41,7 @@ def build_default_config() -> Dict[str, Any]:
         "dpi": 300,
         "languages": ["de", "en"],
         "gpu": False,
+        "quantize": True,
         "column_detection": True,
         "max_columns": 2,
         "heading_threshold_h2": 1.4,
@@ -40,9 +55,28 @@ def build_default_config() -> Dict[str, Any]:
         "keep_line_breaks": False,
         "debug_overlay": False,
         "custom_regex_cleanup": [],
+        "canvas_size": 2560,
+        "mag_ratio": 1.0,
+        "use_text_layer": os.getenv("OCR_SKIP_TEXT_PAGES") == "1",
+        "text_layer_min_chars": 200,
     }
 
 
+@st.cache_resource(show_spinner=False)
+def _cuda_available() -> bool:
+    """Return whether torch sees a CUDA device; imports torch on first use.
+
+    The answer cannot change while the app runs, so it is probed once per
+    process instead of on every rerun with the GPU box ticked.
+    """
+    try:
+        import torch
+
+        return torch.cuda.is_available()
+    except Exception:
+        return False
+
+
 def render_controls(config: Dict[str, Any]) -> Dict[str, Any]:
     """Render Streamlit controls and return updated configuration."""
     st.subheader("Grundeinstellungen")
@@ -51,7 +85,10 @@ def render_controls(config: Dict[str, Any]) -> Dict[str, Any]:
         min_value=72,
         max_value=600,
         value=config["dpi"],
-        help="Auflösung für die PDF-Bild-Konvertierung.",
+        help=(
+            "Auflösung für die PDF-Bild-Konvertierung. Die Canvas-Größe begrenzt die "
+            "wirksame DPI: Bei 2560 px wird eine A4-Seite mit höchstens etwa 219 DPI gerendert."
+        ),
     )
     if dpi > 450:
         st.warning("Sehr hohe DPI können die Laufzeit stark erhöhen.")
@@ -62,14 +99,18 @@ def render_controls(config: Dict[str, Any]) -> Dict[str, Any]:
         help="OCR-Sprachen",
     )
     gpu = st.checkbox("GPU verwenden", value=config["gpu"], help="Aktiviere GPU falls vorhanden")
-    try:
-        import torch
-
-        has_gpu = torch.cuda.is_available()
-    except Exception:
-        has_gpu = False
-    if gpu and not has_gpu:
+    if gpu and not _cuda_available():
         st.warning("Keine GPU verfügbar")
+    quantize = st.checkbox(
+        "INT8-Quantisierung",
+        value=config["quantize"],
+        help="Quantisierte Modelle beschleunigen die OCR auf der CPU (ohne Wirkung auf der GPU).",
+    )
+    use_text_layer = st.checkbox(
+        "Vorhandene Textebene nutzen",
+        value=config["use_text_layer"],
+        help="Seiten, die bereits Text enthalten, ohne OCR übernehmen",
+    )
     output_format = st.selectbox(
         "Ausgabeformat",
         ["docx", "markdown"],
@@ -128,6 +169,22 @@ def render_controls(config: Dict[str, Any]) -> Dict[str, Any]:
             regex_cleanup = st.text_area(
                 "Regex-Cleanup", value="\n".join(config["custom_regex_cleanup"]), help="Eine Regex je Zeile"
             )
+            st.markdown("**Texterkennung**")
+            canvas_size = st.number_input(
+                "Canvas-Größe", 640, 5120, value=int(config["canvas_size"]), step=160,
+                help=(
+                    "Maximale Bildkante in Pixeln; größere Seiten werden vor der OCR verkleinert. "
+                    "Das gilt auch für die Zeichenerkennung, kleine Schrift braucht daher eine größere Canvas."
+                )
+            )
+            mag_ratio = st.number_input(
+                "Vergrößerung", 0.5, 3.0, value=float(config["mag_ratio"]), step=0.1,
+                help="Vergrößerungsfaktor des Textdetektors (genauer, aber langsamer)"
+            )
+            text_layer_min_chars = st.number_input(
+                "Min. Zeichen der Textebene", 1, 10000, value=int(config["text_layer_min_chars"]), step=50,
+                help="Seiten mit weniger eingebettetem Text werden trotz vorhandener Textebene per OCR erkannt"
+            )
     else:
         column_detection = config["column_detection"]
         max_columns = config["max_columns"]
@@ -143,11 +200,15 @@ def render_controls(config: Dict[str, Any]) -> Dict[str, Any]:
         keep_breaks = config["keep_line_breaks"]
         debug_overlay = config["debug_overlay"]
         regex_cleanup = "\n".join(config["custom_regex_cleanup"])
+        canvas_size = config["canvas_size"]
+        mag_ratio = config["mag_ratio"]
+        text_layer_min_chars = config["text_layer_min_chars"]
 
     updated = {
         "dpi": int(dpi),
         "languages": languages or config["languages"],
         "gpu": gpu,
+        "quantize": bool(quantize),
         "column_detection": column_detection,
         "max_columns": int(max_columns),
         "heading_threshold_h2": float(h2),
@@ -161,6 +222,10 @@ def render_controls(config: Dict[str, Any]) -> Dict[str, Any]:
         "keep_line_breaks": bool(keep_breaks),
         "debug_overlay": bool(debug_overlay),
         "custom_regex_cleanup": [r for r in regex_cleanup.splitlines() if r.strip()],
+        "canvas_size": int(canvas_size),
+        "mag_ratio": float(mag_ratio),
+        "use_text_layer": bool(use_text_layer),
+        "text_layer_min_chars": int(text_layer_min_chars),
     }
     return updated
 
@@ -169,142 +234,345 @@ def render_controls(config: Dict[str, Any]) -> Dict[str, Any]:
 # OCR pipeline
 # ---------------------------------------------------------------------------
 
-def ocr_pages(images: List[Image.Image], config: Dict[str, Any]) -> List[List[Dict[str, Any]]]:
-    """Run EasyOCR on given images and return line dicts per page."""
-    reader = easyocr.Reader(config["languages"], gpu=config["gpu"])
-    pages: List[List[Dict[str, Any]]] = []
-    for img in images:
-        result = reader.readtext(np.array(img), detail=1, paragraph=False)
-        lines = [{"bbox": r[0], "text": r[1], "conf": float(r[2])} for r in result]
-        if config.get("column_detection") and len(lines) > 1:
-            lines = _sort_columns(lines, img.size[0], config.get("max_columns", 2))
-        pages.append(lines)
-    return pages
-
-
-def _sort_columns(lines: List[Dict[str, Any]], width: int, max_cols: int) -> List[Dict[str, Any]]:
-    """Sort lines by columns using a simple KMeans clustering."""
+# Upper bound for concurrent page renderers; 3-4 avoids oversubscribing cores.
+PARALLEL_WORKERS = max(1, int(os.getenv("OCR_PARALLEL_WORKERS", min(os.cpu_count() or 1, 4))))
+# Pages per task of the OCR process pool.
+OCR_CHUNK_PAGES = 8
+# OCR worker processes for CPU runs; 1 keeps OCR in the Streamlit process,
+# 0 (the default) sizes the pool to the CPU cores and available memory.
+OCR_PROCESS_WORKERS = max(0, int(os.getenv("OCR_PROCESS_WORKERS", 0)))
+# Memory a CPU OCR worker may need to detect one full-canvas page.
+OCR_WORKER_MEM = 3 * 1024**3
+# Seconds to wait for a chunk from the OCR pool before its workers count as stuck.
+OCR_TASK_TIMEOUT = float(os.getenv("OCR_TASK_TIMEOUT", 900))
+# Rendered pages buffered ahead of in-process OCR; one chunk keeps both busy.
+RENDER_AHEAD = OCR_CHUNK_PAGES
+# Shorter documents are rendered in-process; starting render workers costs more.
+RENDER_POOL_MIN_PAGES = 16
+
+
+def _page_count(pdf_file: bytes) -> int:
+    """Return the number of pages of PDF bytes."""
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(io.BytesIO(pdf_file))
     try:
-        from sklearn.cluster import KMeans
-
-        x_mid = [((min(p[0] for p in l["bbox"]) + max(p[0] for p in l["bbox"])) / 2) for l in lines]
-        k = min(max_cols, len(lines))
-        km = KMeans(n_clusters=k, n_init=10).fit(np.array(x_mid).reshape(-1, 1))
-        labeled = list(zip(km.labels_, lines))
-        labeled.sort(key=lambda t: (t[0], t[1]["bbox"][0][1]))
-        return [l for _, l in labeled]
-    except Exception:
-        return sorted(lines, key=lambda l: l["bbox"][0][1])
+        return len(pdf)
+    finally:
+        pdf.close()
+
 
+def _iter_pdf_images(
+    pdf_file: bytes, n_pages: int, dpi: int, max_side: Optional[int] = None, min_text_chars: int = 0
+) -> Iterator[PageInput]:
+    """Yield the ``n_pages`` pages of PDF bytes in order, as loaded by ``ocr_worker.load_page``.
 
-def _pdf_to_images(pdf_file: bytes, dpi: int) -> List[Image.Image]:
-    """Render PDF bytes to images. Tries pdf2image, falls back to pypdfium2."""
-    images: List[Image.Image] = []
+    Documents of ``RENDER_POOL_MIN_PAGES`` or more are rendered by up to
+    ``PARALLEL_WORKERS`` processes, each with its own copy of the document.
+    """
+    workers = min(PARALLEL_WORKERS, n_pages) if n_pages >= RENDER_POOL_MIN_PAGES else 1
+    if workers > 1:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=ocr_worker.init_render_worker, initargs=(pdf_file,)
+        ) as pool:
+            # Submit only a few pages ahead, so a slow consumer does not pile
+            # up the rendered document in memory.
+            pending: Deque[Future] = deque()
+            for index in range(n_pages):
+                pending.append(pool.submit(ocr_worker.render_page, index, dpi, max_side, min_text_chars))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        return
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(io.BytesIO(pdf_file))
     try:
-        from pdf2image import convert_from_bytes
+        for index in range(n_pages):
+            yield ocr_worker.load_page(pdf, index, dpi, max_side, min_text_chars)
+    finally:
+        pdf.close()
 
-        images = convert_from_bytes(pdf_file, dpi=dpi)
-    except Exception:
-        import pypdfium2 as pdfium
-
-        pdf = pdfium.PdfDocument(io.BytesIO(pdf_file))
-        for page in pdf:
-            pil = page.render(scale=dpi / 72).to_pil()
-            images.append(pil)
-    return images
-
-
-def _write_output(blocks_all: List[List[Dict[str, Any]]], config: Dict[str, Any]) -> str:
-    """Write DOCX or Markdown output and return file path."""
-    tmpdir = tempfile.mkdtemp()
-    if config["output_format"] == "markdown":
-        lines: List[str] = []
-        for page in blocks_all:
-            for block in page:
-                if block["type"] == "h1":
-                    lines.append("# " + block["text"])
-                elif block["type"] == "h2":
-                    lines.append("## " + block["text"])
-                else:
-                    lines.append(block["text"])
-                lines.append("")
-        md = "\n".join(lines)
-        path = os.path.join(tmpdir, "output.md")
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(md)
-        return path
-    else:
+
+def _prefetch(items: Iterable[T], depth: int) -> Iterator[T]:
+    """Iterate ``items`` in a background thread, keeping up to ``depth`` ready.
+
+    This lets page rendering run ahead while the caller does OCR; pdfium and
+    torch release the GIL in native code. ``items`` is only advanced by the
+    background thread, so pdfium is still used from one thread at a time.
+    """
+    buffer: "queue.Queue[Tuple[bool, Any]]" = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def produce() -> None:
         try:
-            from docx import Document
-            from docx.enum.text import WD_ALIGN_PARAGRAPH
-        except Exception:
-            # Fallback to markdown
-            return _write_output(blocks_all, {**config, "output_format": "markdown"})
-        doc = Document()
-        for page in blocks_all:
-            for block in page:
-                if block["type"] == "h1":
-                    doc.add_heading(block["text"], level=1)
-                elif block["type"] == "h2":
-                    doc.add_heading(block["text"], level=2)
-                else:
-                    p = doc.add_paragraph(block["text"])
-                    if config["text_alignment"] == "justify":
-                        p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-        path = os.path.join(tmpdir, "output.docx")
-        doc.save(path)
-        return path
-
-
-def run_ocr(pdf_file: bytes, config: Dict[str, Any]) -> Dict[str, Any]:
-    """Execute OCR pipeline and return results and metrics."""
+            for item in items:
+                if stop.is_set():
+                    break
+                buffer.put((True, item))
+            buffer.put((False, None))
+        except BaseException as exc:
+            buffer.put((False, exc))
+        finally:
+            close = getattr(items, "close", None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=produce, name="pdfocr-render", daemon=True)
+    thread.start()
+    try:
+        while True:
+            ok, item = buffer.get()
+            if not ok:
+                if item is not None:
+                    raise item
+                return
+            yield item
+    finally:
+        # Drain so a producer blocked on a full buffer sees ``stop`` and exits.
+        stop.set()
+        while thread.is_alive():
+            try:
+                buffer.get_nowait()
+            except queue.Empty:
+                thread.join(0.01)
+
+
+def _chunked(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Yield lists of up to ``size`` consecutive items."""
+    it = iter(items)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class _OutputWriter:
+    """Write result blocks page by page to Markdown or DOCX in ``workdir``.
+
+    Markdown is streamed to the file; DOCX is built in memory and saved when
+    the ``with`` block ends without an error. ``path`` is the written file.
+    """
+
+    def __init__(self, config: Dict[str, Any], workdir: str) -> None:
+        self._doc: Any = None
+        self._md: Any = None
+        self._justify = config["text_alignment"] == "justify"
+        if config["output_format"] != "markdown":
+            try:
+                from docx import Document
+                from docx.enum.text import WD_ALIGN_PARAGRAPH
+            except Exception:
+                pass  # Fallback to markdown
+            else:
+                self._doc = Document()
+                self._align = WD_ALIGN_PARAGRAPH.JUSTIFY
+                self.path = os.path.join(workdir, "output.docx")
+                return
+        self.path = os.path.join(workdir, "output.md")
+        self._md = open(self.path, "w", encoding="utf-8")
+        self._sep = ""
+
+    def __enter__(self) -> _OutputWriter:
+        return self
+
+    def __exit__(self, exc_type: Any, *exc: Any) -> None:
+        if self._md is not None:
+            if exc_type is None and self._sep:
+                self._md.write("\n")
+            self._md.close()
+        elif exc_type is None:
+            self._doc.save(self.path)
+
+    def add_page(self, blocks: List[Dict[str, Any]]) -> None:
+        """Append the blocks of the next page."""
+        if self._md is not None:
+            prefixes = {"h1": "# ", "h2": "## "}
+            # Blocks are separated by an empty line.
+            parts: List[str] = []
+            for block in blocks:
+                parts += (self._sep, prefixes.get(block["type"], ""), block["text"])
+                self._sep = "\n\n"
+            self._md.write("".join(parts))
+            return
+        doc = self._doc
+        for block in blocks:
+            if block["type"] == "h1":
+                doc.add_heading(block["text"], level=1)
+            elif block["type"] == "h2":
+                doc.add_heading(block["text"], level=2)
+            else:
+                p = doc.add_paragraph(block["text"])
+                if self._justify:
+                    p.alignment = self._align
+
+
+def _ocr_workers(config: Dict[str, Any], n_chunks: int) -> int:
+    """Return the number of OCR processes to use for ``n_chunks`` page chunks.
+
+    Workers are forked so they share the loaded reader copy-on-write. CUDA
+    contexts cannot be forked, and spawned workers would reload the model on
+    every run, so GPU runs and platforms without a safe fork stay in-process.
+    With the OCR daemon the recognition happens there, so no workers are used.
+    """
+    if ocr_worker.OCR_DAEMON or config["gpu"] or sys.platform != "linux" or n_chunks < 2:
+        return 1
+    return OCR_PROCESS_WORKERS or _default_ocr_workers()
+
+
+@st.cache_resource(show_spinner=False)
+def _default_ocr_workers() -> int:
+    """Return one OCR process per core and ``OCR_WORKER_MEM`` of available memory."""
+    workers = os.cpu_count() or 1
+    try:
+        with open("/proc/meminfo", encoding="ascii") as f:
+            meminfo = dict(line.split(":", 1) for line in f)
+        available = int(meminfo["MemAvailable"].split()[0]) * 1024
+    except (OSError, KeyError, ValueError):
+        return workers
+    return max(1, min(workers, available // OCR_WORKER_MEM))
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def get_ocr_pool(reader_key: Tuple[Tuple[str, ...], bool, bool], workers: int) -> ProcessPoolExecutor:
+    """Return a persistent pool of OCR processes for ``reader_key``.
+
+    The weights are loaded before the workers are forked, and the workers live
+    across runs, so neither the model nor the processes are set up per PDF.
+    Only the latest pool is kept; an evicted executor stops its workers once
+    no run holds it any more.
+    """
+    ocr_worker.get_reader(*reader_key)
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=ocr_worker.init_ocr_worker,
+    )
+
+
+def _discard_ocr_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop ``pool`` from the cache and stop its workers, even if they are busy."""
+    get_ocr_pool.clear()
+    # Before Python 3.14 the executor has no public way to stop running workers.
+    for process in list((getattr(pool, "_processes", None) or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+@functools.lru_cache(maxsize=256)
+def _cleanup_patterns(patterns: Tuple[str, ...]) -> Tuple[re.Pattern[str], ...]:
+    """Compile cleanup regexes once; they are applied one after another in order."""
+    return tuple(re.compile(p) for p in patterns)
+
+
+def run_ocr(
+    pdf_file: bytes,
+    config: Dict[str, Any],
+    workdir: Optional[str] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, Any]:
+    """Execute OCR pipeline and return results and metrics.
+
+    Output files are written to ``workdir``, or a new temporary directory.
+    ``progress`` is called with the pages done and the page count as pages
+    finish in order.
+    """
+    workdir = workdir or tempfile.mkdtemp()
     start = time.time()
-    images = _pdf_to_images(pdf_file, config["dpi"])
-    if not images:
+    n_pages = _page_count(pdf_file)
+    if not n_pages:
         return {"pages": 0, "lines": 0, "avg_conf": 0.0}
-    page_lines = ocr_pages(images, config)
-    blocks_all: List[List[Dict[str, Any]]] = []
+    min_text_chars = config.get("text_layer_min_chars", 200) if config.get("use_text_layer") else 0
+    pages = _iter_pdf_images(pdf_file, n_pages, config["dpi"], config.get("canvas_size"), min_text_chars)
+    # Only the first page is kept for the debug overlay, if it was rendered.
+    first_image: Optional[np.ndarray] = None
+    first_lines: List[Dict[str, Any]] = []
     page_stats: List[Dict[str, Any]] = []
     total_lines = 0
-    confidences: List[float] = []
-    classified_pages: List[List[Dict[str, Any]]] = []
-    for img, lines in zip(images, page_lines):
-        classified, median = heur.classify_lines(lines, img.size, config)
-        blocks = heur.build_blocks(classified, median, img.size, config)
-        blocks_all.append(blocks)
-        page_stats.append(
-            {
-                "median_height": median,
-                "line_heights": [l["height"] for l in classified],
-                "h1": sum(1 for l in classified if l["level"] == "h1"),
-                "h2": sum(1 for l in classified if l["level"] == "h2"),
-            }
-        )
-        total_lines += len(lines)
-        confidences.extend([l["conf"] for l in lines])
-        classified_pages.append(classified)
-    if config.get("custom_regex_cleanup"):
-        import re
-
-        patterns = [re.compile(r) for r in config["custom_regex_cleanup"]]
-        for page in blocks_all:
-            for block in page:
-                text = block["text"]
-                for pat in patterns:
-                    text = pat.sub("", text)
-                block["text"] = text
-    out_path = _write_output(blocks_all, config)
+    ocr_lines = 0
+    text_pages = 0
+    conf_sum = 0.0
+    cleanup = _cleanup_patterns(tuple(config.get("custom_regex_cleanup") or ()))
+    workers = _ocr_workers(config, -(-n_pages // OCR_CHUNK_PAGES))
+
+    def collect(results: List[Dict[str, Any]]) -> None:
+        # Pages arrive in order and are written right away, so the text of
+        # the document is never held in memory as a whole.
+        nonlocal total_lines, ocr_lines, text_pages, conf_sum
+        for page in results:
+            ocr_page, classified, median = page["ocr"], page["classified"], page["median"]
+            if not page_stats:
+                first_lines.extend(classified)
+            levels = Counter(l["level"] for l in classified)
+            page_stats.append(
+                {
+                    "median_height": median,
+                    "line_heights": [l["height"] for l in classified],
+                    "h1": levels["h1"],
+                    "h2": levels["h2"],
+                }
+            )
+            total_lines += len(ocr_page)
+            # Text-layer lines were not recognised, so they carry no confidence.
+            if page["text_layer"]:
+                text_pages += 1
+            else:
+                ocr_lines += len(ocr_page)
+                conf_sum += float(ocr_page.confs.sum(dtype=np.float64))
+            if cleanup:
+                for block in page["blocks"]:
+                    text = block["text"]
+                    for pat in cleanup:
+                        text = pat.sub("", text)
+                    block["text"] = text
+            writer.add_page(page["blocks"])
+        if progress:
+            progress(len(page_stats), n_pages)
+
+    with _OutputWriter(config, workdir) as writer:
+        if workers > 1:
+            pool = get_ocr_pool(ocr_worker.reader_key(config), workers)
+            # OCR runs in the workers, so chunks are handed over as soon as
+            # they are rendered and rendering continues meanwhile.
+            pending: Deque[Future] = deque()
+            try:
+                for n, chunk in enumerate(_chunked(pages, OCR_CHUNK_PAGES)):
+                    if n == 0 and isinstance(chunk[0], np.ndarray):
+                        first_image = chunk[0]
+                    pending.append(pool.submit(ocr_worker.layout_pages, chunk, config))
+                    # Bound the chunks waiting for a worker, as each holds its pages.
+                    while pending and (pending[0].done() or len(pending) > 2 * workers):
+                        collect(pending.popleft().result(timeout=OCR_TASK_TIMEOUT))
+                while pending:
+                    collect(pending.popleft().result(timeout=OCR_TASK_TIMEOUT))
+            except BrokenProcessPool:
+                # A crashed worker breaks the pool for good; start fresh next run.
+                get_ocr_pool.clear()
+                raise
+            except TimeoutError:
+                # Stuck workers would block every later run that shares the pool.
+                _discard_ocr_pool(pool)
+                raise
+        else:
+            # Render the next chunk in the background while this one is read.
+            for n, chunk in enumerate(_chunked(_prefetch(pages, RENDER_AHEAD), OCR_CHUNK_PAGES)):
+                if n == 0 and isinstance(chunk[0], np.ndarray):
+                    first_image = chunk[0]
+                collect(ocr_worker.layout_pages(chunk, config))
     runtime = time.time() - start
-    logging.info("Processed %s pages in %.2fs", len(images), runtime)
+    logging.info("Processed %s pages in %.2fs", n_pages, runtime)
     return {
-        "pages": len(images),
+        "pages": n_pages,
         "lines": total_lines,
-        "avg_conf": float(np.mean(confidences)) if confidences else 0.0,
-        "blocks": blocks_all,
+        "avg_conf": conf_sum / ocr_lines if ocr_lines else 0.0,
+        "text_pages": text_pages,
         "page_stats": page_stats,
-        "images": images,
-        "classified_lines": classified_pages,
-        "doc_path": out_path,
+        "first_image": first_image,
+        "first_lines": first_lines,
+        "doc_path": writer.path,
+        "dir": workdir,
     }
 
 
@@ -312,15 +580,58 @@ def run_ocr(pdf_file: bytes, config: Dict[str, Any]) -> Dict[str, Any]:
 # Reporting
 # ---------------------------------------------------------------------------
 
+# Outline colours of the debug overlay per line level.
+OVERLAY_COLORS = {"h1": (0, 0, 255), "h2": (255, 0, 0), "p": (0, 128, 0)}
+# JPEG quality of the debug overlay; encodes far faster than PNG at page size.
+OVERLAY_JPEG_QUALITY = 60
+
+
+def _draw_overlay(page: np.ndarray, lines: List[Dict[str, Any]]) -> Image.Image:
+    """Outline the line boxes of a grayscale page, coloured by line level.
+
+    Boxes are grouped by level so OpenCV draws each colour in one call; PIL is
+    the fallback when OpenCV is unavailable.
+    """
+    from PIL import Image, ImageDraw
+
+    rgb = np.stack([page] * 3, axis=-1)
+    groups: Dict[str, List[Any]] = {}
+    for line in lines:
+        groups.setdefault(line["level"], []).append(line["bbox"])
+    try:
+        import cv2
+    except Exception:
+        img = Image.fromarray(rgb)
+        draw = ImageDraw.Draw(img)
+        for level, boxes in groups.items():
+            for bbox in boxes:
+                draw.polygon([tuple(p) for p in bbox], outline=OVERLAY_COLORS[level])
+        return img
+    for level, boxes in groups.items():
+        pts = np.rint(np.asarray(boxes, dtype=np.float32)).astype(np.int32)
+        cv2.polylines(rgb, list(pts), isClosed=True, color=OVERLAY_COLORS[level])
+    return Image.fromarray(rgb)
+
+
+# Resolution of the diagnostic plots; they are shown as small thumbnails.
+PLOT_DPI = 72
+
+
 def make_debug_plots(results: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, str]:
     """Create diagnostic plots and return their file paths."""
     paths: Dict[str, str] = {}
-    tmpdir = tempfile.mkdtemp()
+    tmpdir = results.get("dir") or tempfile.mkdtemp()
     paths["dir"] = tmpdir
     try:
+        import matplotlib
+
+        # Non-interactive raster backend; the plots are only saved as PNGs.
+        matplotlib.use("Agg")
         import matplotlib.pyplot as plt
     except Exception:
         # Create placeholder images if matplotlib is unavailable
+        from PIL import Image
+
         img = Image.new("RGB", (200, 100), "white")
         img.save(os.path.join(tmpdir, "placeholder.png"))
         paths["histogram"] = os.path.join(tmpdir, "placeholder.png")
@@ -338,7 +649,7 @@ def make_debug_plots(results: Dict[str, Any], config: Dict[str, Any]) -> Dict[st
             plt.axvline(med * config["heading_threshold_h1"], color="red", label="H1")
             plt.legend()
             path = os.path.join(tmpdir, "line_heights.png")
-            plt.savefig(path)
+            plt.savefig(path, dpi=PLOT_DPI)
             plt.close()
             paths["histogram"] = path
     if results.get("page_stats"):
@@ -352,21 +663,13 @@ def make_debug_plots(results: Dict[str, Any], config: Dict[str, Any]) -> Dict[st
         plt.ylabel("Anzahl")
         plt.legend()
         path2 = os.path.join(tmpdir, "heading_counts.png")
-        plt.savefig(path2)
+        plt.savefig(path2, dpi=PLOT_DPI)
         plt.close()
         paths["heading_counts"] = path2
-    if config.get("debug_overlay") and results.get("images"):
-        img = results["images"][0].copy()
-        draw = ImageDraw.Draw(img)
-        for line in results["classified_lines"][0]:
-            color = "green"
-            if line["level"] == "h1":
-                color = "blue"
-            elif line["level"] == "h2":
-                color = "red"
-            draw.polygon([tuple(p) for p in line["bbox"]], outline=color)
-        overlay_path = os.path.join(tmpdir, "overlay.png")
-        img.save(overlay_path)
+    if config.get("debug_overlay") and results.get("first_image") is not None:
+        img = _draw_overlay(results["first_image"], results["first_lines"])
+        overlay_path = os.path.join(tmpdir, "overlay.jpg")
+        img.save(overlay_path, "JPEG", quality=OVERLAY_JPEG_QUALITY)
         paths["overlay"] = overlay_path
     return paths
 
@@ -397,6 +700,13 @@ def generate_report(results: Dict[str, Any], config: Dict[str, Any], plots: Dict
 # Streamlit UI
 # ---------------------------------------------------------------------------
 
+def _session_workdir() -> str:
+    """Return the session's scratch directory, removed when the session ends."""
+    if "workdir" not in st.session_state:
+        st.session_state["workdir"] = tempfile.TemporaryDirectory(prefix="pdfocr-")
+    return st.session_state["workdir"].name
+
+
 def main() -> None:
     st.set_page_config(page_title="PDF OCR")
     st.title("PDF OCR Pipeline")
@@ -415,18 +725,34 @@ def main() -> None:
             st.warning("Bitte zuerst eine PDF-Datei hochladen.")
         else:
             with st.spinner("Verarbeite..."):
-                results = run_ocr(st.session_state["uploaded_pdf"], config)
+                previous_dir = st.session_state.get("run_dir")
+                run_dir = tempfile.mkdtemp(dir=_session_workdir())
+                bar = st.progress(0.0)
+                results = run_ocr(
+                    st.session_state["uploaded_pdf"],
+                    config,
+                    run_dir,
+                    lambda done, total: bar.progress(done / total, text=f"Seite {done} von {total}"),
+                )
+                bar.empty()
                 plots = make_debug_plots(results, config)
                 report_path = generate_report(results, config, plots)
                 st.session_state["results"] = results
                 st.session_state["plots"] = plots
                 st.session_state["report_path"] = report_path
+                st.session_state["run_dir"] = run_dir
+                if previous_dir:
+                    shutil.rmtree(previous_dir, ignore_errors=True)
 
     if st.session_state.get("results"):
         res = st.session_state["results"]
-        st.success(
-            f"Seiten: {res['pages']} | Zeilen: {res['lines']} | Ø Konfidenz: {res['avg_conf']:.2f}"
-        )
+        text_pages = res.get("text_pages", 0)
+        summary = f"Seiten: {res['pages']} | Zeilen: {res['lines']}"
+        if res["pages"] > text_pages:
+            summary += f" | Ø Konfidenz: {res['avg_conf']:.2f}"
+        if text_pages:
+            summary += f" | Aus Textebene: {text_pages} Seiten"
+        st.success(summary)
         for name, path in st.session_state["plots"].items():
             if name == "dir":
                 continue
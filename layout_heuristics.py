@@ -1,57 +1,82 @@
 """Layout heuristics for OCR results."""
 from __future__ import annotations
-from typing import Dict, List, Tuple, Any
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Any
 import numpy as np
 
 Line = Dict[str, Any]
 
 
-def _line_height(line: Line) -> float:
-    bbox = line["bbox"]
-    y = [p[1] for p in bbox]
-    return float(max(y) - min(y))
+@dataclass
+class Page:
+    """OCR lines of one page as parallel arrays.
 
+    ``bboxes`` has shape ``(N, 4, 2)`` and ``confs`` shape ``(N,)``, so
+    geometry can be computed for all lines at once.
+    """
+
+    bboxes: np.ndarray
+    texts: List[str]
+    confs: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.texts)
 
-def _line_width(line: Line) -> float:
-    bbox = line["bbox"]
-    x = [p[0] for p in bbox]
-    return float(max(x) - min(x))
+    def take(self, order: np.ndarray) -> Page:
+        """Return the page with its lines reordered by ``order``."""
+        return Page(self.bboxes[order], [self.texts[i] for i in order], self.confs[order])
 
+    def lines(self) -> List[Line]:
+        """Return the lines as dicts for the line-based heuristics."""
+        return [
+            {"bbox": bbox, "text": text, "conf": conf}
+            for bbox, text, conf in zip(self.bboxes.tolist(), self.texts, self.confs.tolist())
+        ]
 
-def classify_lines(lines: List[Line], page_size: Tuple[int, int], config: Dict[str, Any]) -> Tuple[List[Line], float]:
+
+def _bbox_array(lines: List[Line], bboxes: Optional[np.ndarray]) -> np.ndarray:
+    """Return the line boxes as one ``(N, 4, 2)`` array.
+
+    ``bboxes`` are the boxes of ``lines`` when the caller already has them, as
+    with ``Page.bboxes``; otherwise they are collected from the line dicts.
+    """
+    if bboxes is None:
+        bboxes = [l["bbox"] for l in lines]
+    return np.asarray(bboxes, dtype=np.float64).reshape(-1, 4, 2)
+
+
+def classify_lines(
+    lines: List[Line],
+    page_size: Tuple[int, int],
+    config: Dict[str, Any],
+    bboxes: Optional[np.ndarray] = None,
+) -> Tuple[List[Line], float]:
     """Classify lines as headings or paragraphs.
 
     Returns updated line dicts with ``level`` and the page's median line height.
     """
     if not lines:
         return [], 0.0
-    heights = [_line_height(l) for l in lines]
+    bb = _bbox_array(lines, bboxes)
+    x_min, x_max = bb[:, :, 0].min(axis=1), bb[:, :, 0].max(axis=1)
+    y_min, y_max = bb[:, :, 1].min(axis=1), bb[:, :, 1].max(axis=1)
+    heights = y_max - y_min
     median_h = float(np.median(heights))
     width = float(page_size[0])
+    rules = config["heading_extra_rules"]
+    extra = np.zeros(len(lines), dtype=bool)
+    if rules.get("centered"):
+        extra |= np.abs((x_max + x_min) / 2.0 - width / 2) < 0.05 * width
+    if rules.get("all_caps"):
+        extra |= np.fromiter((l.get("text", "").isupper() for l in lines), dtype=bool, count=len(lines))
+    if rules.get("big_gap"):
+        # Gap to the previous line's bottom; the first line counts from the page top.
+        extra |= y_min - np.concatenate(([0.0], y_max[:-1])) > 0.8 * median_h
+    h1 = heights > config["heading_threshold_h1"] * median_h
+    h2 = ~h1 & (heights > config["heading_threshold_h2"] * median_h) & (x_max - x_min < 0.75 * width) & extra
+    levels = np.where(h1, "h1", np.where(h2, "h2", "p")).tolist()
     out: List[Line] = []
-    prev_bottom = 0.0
-    for line, h in zip(lines, heights):
-        bbox = line["bbox"]
-        x = [p[0] for p in bbox]
-        y = [p[1] for p in bbox]
-        line_width = _line_width(line)
-        center_x = (max(x) + min(x)) / 2.0
-        gap = min(y) - prev_bottom
-        prev_bottom = max(y)
-        text = line.get("text", "")
-        level = "p"
-        if h > config["heading_threshold_h1"] * median_h:
-            level = "h1"
-        elif (
-            h > config["heading_threshold_h2"] * median_h
-            and line_width < 0.75 * width
-            and (
-                (config["heading_extra_rules"].get("centered") and abs(center_x - width / 2) < 0.05 * width)
-                or (config["heading_extra_rules"].get("all_caps") and text.isupper())
-                or (config["heading_extra_rules"].get("big_gap") and gap > 0.8 * median_h)
-            )
-        ):
-            level = "h2"
+    for line, level, h in zip(lines, levels, heights.tolist()):
         out_line = dict(line)
         out_line["level"] = level
         out_line["height"] = h
@@ -59,61 +84,59 @@ def classify_lines(lines: List[Line], page_size: Tuple[int, int], config: Dict[s
     return out, median_h
 
 
-def build_blocks(lines: List[Line], median_h: float, page_size: Tuple[int, int], config: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Merge lines into text blocks (paragraphs and headings)."""
+def build_blocks(
+    lines: List[Line],
+    median_h: float,
+    page_size: Tuple[int, int],
+    config: Dict[str, Any],
+    bboxes: Optional[np.ndarray] = None,
+) -> List[Dict[str, Any]]:
+    """Merge lines into text blocks (paragraphs and headings).
+
+    A paragraph line joins the paragraph of the line before it when that is a
+    paragraph line too, with a similar left edge and a small vertical gap.
+    """
+    if not lines:
+        return []
     width = float(page_size[0])
+    bb = _bbox_array(lines, bboxes)
+    left = bb[:, :, 0].min(axis=1)
+    top = bb[:, :, 1].min(axis=1)
+    bottom = bb[:, :, 1].max(axis=1)
+    is_p = np.fromiter((l["level"] == "p" for l in lines), dtype=bool, count=len(lines))
+    joins = np.zeros(len(lines), dtype=bool)
+    joins[1:] = (
+        is_p[1:]
+        & is_p[:-1]
+        & (np.abs(left[1:] - left[:-1]) <= config["indent_tolerance"] * width)
+        & (top[1:] - bottom[:-1] <= config["paragraph_merge_gap"] * median_h)
+    )
     blocks: List[Dict[str, Any]] = []
     para: List[Line] = []
-    prev_bottom = None
-    prev_left = None
-    for line in lines:
-        bbox = line["bbox"]
-        x = [p[0] for p in bbox]
-        y = [p[1] for p in bbox]
-        left = min(x)
-        top = min(y)
+    for line, join in zip(lines, joins.tolist()):
+        if para and not join:
+            blocks.append({"type": "p", "text": _merge_para(para, config)})
+            para = []
         if line["level"] != "p":
-            if para:
-                blocks.append({"type": "p", "text": _merge_para(para, config)})
-                para = []
             blocks.append({"type": line["level"], "text": line["text"]})
-            prev_bottom = max(y)
-            prev_left = left
-            continue
-        if not para:
-            para.append(line)
-            prev_bottom = max(y)
-            prev_left = left
-            continue
-        gap = top - (prev_bottom or 0)
-        if (
-            abs(left - (prev_left or 0)) <= config["indent_tolerance"] * width
-            and gap <= config["paragraph_merge_gap"] * median_h
-        ):
-            para.append(line)
         else:
-            blocks.append({"type": "p", "text": _merge_para(para, config)})
-            para = [line]
-        prev_bottom = max(y)
-        prev_left = left
+            para.append(line)
     if para:
         blocks.append({"type": "p", "text": _merge_para(para, config)})
     return blocks
 
 
 def _merge_para(lines: List[Line], config: Dict[str, Any]) -> str:
-    texts: List[str] = []
+    # Lines and separators go into one list that is joined once. A hyphen
+    # merge only trims the previous line, never the text merged so far.
+    hyphen_merge = config.get("hyphen_merge")
+    sep = "\n" if config.get("keep_line_breaks") else " "
+    pieces: List[str] = []
     for line in lines:
         t = line.get("text", "")
-        if (
-            texts
-            and config.get("hyphen_merge")
-            and texts[-1].endswith("-")
-            and t[:1].islower()
-        ):
-            texts[-1] = texts[-1][:-1] + t
-        else:
-            texts.append(t)
-    sep = "\n" if config.get("keep_line_breaks") else " "
-    return sep.join(texts)
-
+        if pieces and hyphen_merge and pieces[-1].endswith("-") and t[:1].islower():
+            pieces[-1] = pieces[-1][:-1]
+        elif pieces:
+            pieces.append(sep)
+        pieces.append(t)
+    return "".join(pieces)
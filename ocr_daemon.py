@@ -0,0 +1,172 @@
+"""Persistent OCR process that keeps EasyOCR readers loaded across app restarts.
+
+Start it with ``python ocr_daemon.py [languages ...]`` to preload a reader, or
+let the app start it on first use when ``OCR_DAEMON=1`` is set. Requests come
+in over a Unix socket in a directory only the current user can access, and
+connections must prove they know the key the daemon stores there.
+"""
+from __future__ import annotations
+
+import fcntl
+import logging
+import os
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing.connection import AuthenticationError, Client, Connection, Listener
+from typing import Any, Dict, List, Tuple
+
+# (languages, gpu, quantize), as built by ``ocr_worker.reader_key``.
+ReaderKey = Tuple[Tuple[str, ...], bool, bool]
+
+# Seconds the app waits for a freshly started daemon to accept connections.
+START_TIMEOUT = 30.0
+# Errors of a connection attempt while no daemon, or one still starting, is listening.
+CONNECT_ERRORS = (FileNotFoundError, ConnectionRefusedError, AuthenticationError, EOFError)
+
+
+def socket_path() -> str:
+    """Return the path of the daemon's Unix socket."""
+    return os.getenv("OCR_DAEMON_SOCKET") or os.path.join(
+        tempfile.gettempdir(), f"pdfocr-{os.getuid()}", "ocr.sock"
+    )
+
+
+def _check_private_dir(path: str) -> None:
+    """Create directory ``path`` if needed and make sure only the current user can access it.
+
+    ``makedirs`` accepts an existing directory, which another user may have
+    created first to intercept the socket, so ownership and mode are checked.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise RuntimeError(f"{path} must be a directory owned by the current user with mode 0700")
+
+
+def _authkey_path(path: str) -> str:
+    """Return the path of the key file next to socket ``path``."""
+    return os.path.join(os.path.dirname(path), "authkey")
+
+
+def _client(path: str) -> Connection:
+    """Open an authenticated connection to the daemon on socket ``path``."""
+    with open(_authkey_path(path), "rb") as f:
+        authkey = f.read()
+    return Client(path, family="AF_UNIX", authkey=authkey)
+
+
+def _connect() -> Connection:
+    """Connect to the daemon, starting it if it is not running."""
+    path = socket_path()
+    _check_private_dir(os.path.dirname(path))
+    try:
+        return _client(path)
+    except CONNECT_ERRORS:
+        pass
+    subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__)], stdin=subprocess.DEVNULL, start_new_session=True
+    )
+    deadline = time.monotonic() + START_TIMEOUT
+    while True:
+        time.sleep(0.1)
+        try:
+            return _client(path)
+        except CONNECT_ERRORS:
+            if time.monotonic() > deadline:
+                raise
+
+
+def readtext_batched(key: ReaderKey, images: List[Any], **kwargs: Any) -> List[Any]:
+    """Run ``Reader.readtext_batched`` in the daemon with the reader for ``key``."""
+    with _connect() as conn:
+        conn.send((key, images, kwargs))
+        ok, payload = conn.recv()
+    if not ok:
+        raise RuntimeError(f"OCR daemon failed: {payload}")
+    return payload
+
+
+def _get_reader(readers: Dict[ReaderKey, Any], key: ReaderKey) -> Any:
+    """Return the reader for ``key``, loading it on first use.
+
+    Only one reader is kept loaded, like the app's own reader cache.
+    """
+    if key not in readers:
+        import easyocr
+
+        readers.clear()
+
+        languages, gpu, quantize = key
+        logging.info("Loading reader for %s", ", ".join(languages))
+        readers[key] = easyocr.Reader(list(languages), gpu=gpu, quantize=quantize, cudnn_benchmark=True)
+    return readers[key]
+
+
+def serve(preload: List[ReaderKey]) -> None:
+    """Answer OCR requests until the process is stopped."""
+    path = socket_path()
+    directory = os.path.dirname(path)
+    _check_private_dir(directory)
+    # Daemons started at the same time take turns, so none unlinks the socket
+    # or replaces the key of one that has just bound.
+    lock = os.open(os.path.join(directory, "lock"), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            _client(path).close()
+        except CONNECT_ERRORS:
+            pass
+        else:
+            logging.info("OCR daemon already running on %s", path)
+            return
+        if os.path.exists(path):
+            os.unlink(path)  # Left over from a daemon that did not shut down cleanly
+        # A fresh key per daemon; it is replaced atomically so clients never
+        # read a partly written one.
+        authkey = os.urandom(32)
+        key_path = _authkey_path(path)
+        fd = os.open(key_path + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(authkey)
+        os.replace(key_path + ".tmp", key_path)
+        listener = Listener(path, family="AF_UNIX", authkey=authkey)
+    finally:
+        os.close(lock)
+    readers: Dict[ReaderKey, Any] = {}
+    with listener:
+        # Clients connecting meanwhile wait in the listen backlog.
+        for key in preload:
+            _get_reader(readers, key)
+        logging.info("OCR daemon listening on %s", path)
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, EOFError, OSError):
+                logging.warning("Rejected a connection that did not authenticate")
+                continue
+            with conn:
+                try:
+                    key, images, kwargs = conn.recv()
+                except EOFError:
+                    continue  # A startup probe, or a client that went away
+                except Exception:
+                    logging.exception("Could not read OCR request")
+                    continue
+                try:
+                    reply = (True, _get_reader(readers, key).readtext_batched(images, **kwargs))
+                except Exception as exc:
+                    logging.exception("OCR request failed")
+                    reply = (False, repr(exc))
+                try:
+                    conn.send(reply)
+                except OSError:
+                    logging.warning("Client disconnected before its answer was sent")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    languages = tuple(sorted(set(sys.argv[1:])))
+    serve([(languages, False, True)] if languages else [])
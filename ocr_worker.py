@@ -0,0 +1,295 @@
+"""Page rendering and OCR steps that run in the app's worker processes.
+
+Process pools pickle their tasks by module and function name. Streamlit runs
+``app.py`` as a fresh ``__main__`` on every rerun, so functions defined there
+no longer resolve once the script has rerun; functions of this imported
+module stay the same objects for the lifetime of the process.
+"""
+from __future__ import annotations
+
+import functools
+import io
+import logging
+import math
+import os
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import streamlit as st
+
+import layout_heuristics as heur
+
+if TYPE_CHECKING:
+    import easyocr
+
+# Pages handed to the CRAFT detector in one batched forward pass on GPU. CPU
+# runs detect one page at a time, since a full-canvas page alone takes ~3 GB.
+OCR_BATCH_SIZE = 8
+# Run OCR in the persistent ocr_daemon process, which outlives app restarts.
+OCR_DAEMON = os.getenv("OCR_DAEMON") == "1"
+# Pixel budget per rendered page; larger pages are rendered at a lower DPI.
+OCR_MAX_PX = int(os.getenv("OCR_MAX_PX", 25_000_000))
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def get_reader(languages: Tuple[str, ...], gpu: bool, quantize: bool = True) -> easyocr.Reader:
+    """Return an EasyOCR reader, loading the model weights once per process.
+
+    With ``quantize`` the CPU models get int8 dynamic quantization. Only the
+    latest reader is kept, so switching languages does not pile up models.
+    """
+    import easyocr
+
+    if not gpu:
+        import torch
+
+        # The models run one op at a time, so the inter-op pool only adds
+        # idle threads; intra-op threads keep torch's per-core default.
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # Can only be set before torch's first parallel work
+    return easyocr.Reader(list(languages), gpu=gpu, quantize=quantize, cudnn_benchmark=True)
+
+
+def reader_key(config: Dict[str, Any]) -> Tuple[Tuple[str, ...], bool, bool]:
+    """Return the ``get_reader`` arguments for ``config``.
+
+    EasyOCR merges the character sets of all languages, so their order does
+    not matter; sorting keeps "de, en" and "en, de" on the same cached reader.
+    """
+    return tuple(sorted(set(config["languages"]))), config["gpu"], config.get("quantize", True)
+
+
+@dataclass
+class TextPage:
+    """A page whose lines come from its PDF text layer instead of OCR."""
+
+    lines: heur.Page
+    size: Tuple[int, int]
+
+
+# A rendered page for OCR, or a page that already has its text.
+PageInput = Union[np.ndarray, TextPage]
+
+
+def page_size(img: PageInput) -> Tuple[int, int]:
+    """Return ``(width, height)`` of a rendered page."""
+    if isinstance(img, TextPage):
+        return img.size
+    return img.shape[1], img.shape[0]
+
+
+def ocr_pages(images: List[PageInput], config: Dict[str, Any]) -> List[heur.Page]:
+    """Run EasyOCR on given images and return the recognised lines per page.
+
+    The detector needs equally sized inputs, so pages are grouped by size and
+    each group is detected in batches of ``OCR_BATCH_SIZE`` on GPU, page by
+    page on CPU; results keep the page order. Text-layer pages are passed
+    through without OCR.
+    """
+    pages: List[Optional[heur.Page]] = [None] * len(images)
+    by_size: Dict[Tuple[int, int], List[int]] = {}
+    for i, img in enumerate(images):
+        if isinstance(img, TextPage):
+            pages[i] = img.lines
+        else:
+            by_size.setdefault(page_size(img), []).append(i)
+    batch_size = OCR_BATCH_SIZE if config["gpu"] else 1
+    if by_size:
+        key = reader_key(config)
+        if OCR_DAEMON:
+            import ocr_daemon
+
+            readtext_batched = functools.partial(ocr_daemon.readtext_batched, key)
+        else:
+            readtext_batched = get_reader(*key).readtext_batched
+    for indices in by_size.values():
+        for start in range(0, len(indices), batch_size):
+            chunk = indices[start:start + batch_size]
+            results = readtext_batched(
+                [images[i] for i in chunk],
+                batch_size=batch_size,
+                detail=1,
+                paragraph=False,
+                canvas_size=config.get("canvas_size", 2560),
+                mag_ratio=config.get("mag_ratio", 1.0),
+            )
+            for i, result in zip(chunk, results):
+                pages[i] = heur.Page(
+                    np.asarray([r[0] for r in result], dtype=np.float32).reshape(-1, 4, 2),
+                    [r[1] for r in result],
+                    np.asarray([r[2] for r in result], dtype=np.float32),
+                )
+    if config.get("column_detection"):
+        for i, page in enumerate(pages):
+            if len(page) > 1:
+                pages[i] = _sort_columns(page, page_size(images[i])[0], config.get("max_columns", 2))
+    return pages
+
+
+def _sort_columns(page: heur.Page, width: int, max_cols: int) -> heur.Page:
+    """Sort lines column by column, reading columns left to right.
+
+    Line midpoints are sorted and split at the ``max_cols - 1`` widest gaps,
+    which is the optimal 1-D clustering for well separated columns. Pages whose
+    midpoints are too close together for several columns, the common case,
+    are only sorted top to bottom.
+    """
+    bboxes = page.bboxes
+    xs = 0.5 * (bboxes[:, :, 0].min(axis=1) + bboxes[:, :, 0].max(axis=1))
+    if xs.max() - xs.min() < 0.35 * width or xs.std() < 0.1 * width:
+        return page.take(np.argsort(bboxes[:, 0, 1], kind="stable"))
+    k = min(max_cols, len(page))
+    column = np.zeros(len(page), dtype=np.intp)
+    if k > 1:
+        xs_sorted = np.sort(xs)
+        gaps = np.diff(xs_sorted)
+        split_idx = np.argpartition(gaps, -(k - 1))[-(k - 1):]
+        split_idx = split_idx[gaps[split_idx] > 0]
+        bounds = np.sort((xs_sorted[split_idx] + xs_sorted[split_idx + 1]) / 2)
+        column = np.searchsorted(bounds, xs)
+    return page.take(np.lexsort((bboxes[:, 0, 1], column)))
+
+
+def layout_pages(images: List[PageInput], config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Run OCR and the layout heuristics on pages and return per-page results."""
+    pages: List[Dict[str, Any]] = []
+    for img, ocr_page in zip(images, ocr_pages(images, config)):
+        size = page_size(img)
+        classified, median = heur.classify_lines(ocr_page.lines(), size, config, ocr_page.bboxes)
+        blocks = heur.build_blocks(classified, median, size, config, ocr_page.bboxes)
+        pages.append(
+            {
+                "ocr": ocr_page,
+                "classified": classified,
+                "blocks": blocks,
+                "median": median,
+                "text_layer": isinstance(img, TextPage),
+            }
+        )
+    return pages
+
+
+def init_ocr_worker() -> None:
+    """Run torch single-threaded in a forked OCR worker."""
+    import torch
+
+    # Loading the reader started torch's OpenMP pool in the parent; a forked
+    # child using more than one thread deadlocks on that pool's stale state.
+    torch.set_num_threads(1)
+
+
+# Per-process document handle of the pdfium render workers.
+_WORKER_PDF: Any = None
+
+
+def init_render_worker(pdf_file: bytes) -> None:
+    """Open the document once in a render worker process."""
+    global _WORKER_PDF
+    import pypdfium2 as pdfium
+
+    _WORKER_PDF = pdfium.PdfDocument(io.BytesIO(pdf_file))
+
+
+def _render_scale(page: Any, dpi: int, max_side: Optional[int]) -> float:
+    """Return the render scale for ``dpi``, capped to ``max_side`` pixels per side and ``OCR_MAX_PX`` per page."""
+    scale = dpi / 72
+    width, height = page.get_size()
+    if max_side:
+        scale = min(scale, max_side / max(width, height))
+    budget = math.sqrt(OCR_MAX_PX / (width * height))
+    if scale > budget:
+        logging.debug(
+            "Page of %.0fx%.0f pt exceeds %d px, rendering at %.0f DPI", width, height, OCR_MAX_PX, budget * 72
+        )
+        scale = budget
+    return scale
+
+
+# A piece of embedded text and its box ``(x0, y0, x1, y1, text)`` in pixels.
+TextRect = Tuple[float, float, float, float, str]
+
+
+def _merge_rects(rects: List[TextRect]) -> List[TextRect]:
+    """Merge PDFium's text rectangles, which break at font changes, into lines read left to right."""
+    rows: List[List[TextRect]] = []
+    top = bottom = 0.0
+    for rect in sorted(rects, key=lambda r: r[1] + r[3]):
+        y0, y1 = rect[1], rect[3]
+        if rows and min(y1, bottom) - max(y0, top) >= 0.5 * min(y1 - y0, bottom - top):
+            rows[-1].append(rect)
+            top, bottom = min(top, y0), max(bottom, y1)
+        else:
+            rows.append([rect])
+            top, bottom = y0, y1
+    merged: List[TextRect] = []
+    for row in rows:
+        row.sort()
+        height = max(r[3] for r in row) - min(r[1] for r in row)
+        line = [row[0]]
+        for rect in row[1:] + [None]:
+            if rect is not None and rect[0] - max(r[2] for r in line) <= 1.5 * height:
+                line.append(rect)
+                continue
+            parts = [line[0][4]]
+            for prev, cur in zip(line, line[1:]):
+                if cur[0] - prev[2] > 0.25 * height and not prev[4][-1:].isspace() and not cur[4][:1].isspace():
+                    parts.append(" ")
+                parts.append(cur[4])
+            merged.append((
+                line[0][0], min(r[1] for r in line), max(r[2] for r in line), max(r[3] for r in line),
+                " ".join("".join(parts).split()),
+            ))
+            line = [rect]
+    return merged
+
+
+def _text_layer(page: Any, scale: float, min_chars: int) -> Optional[heur.Page]:
+    """Return the page's embedded text lines in pixels at ``scale``, or ``None`` below ``min_chars``."""
+    textpage = page.get_textpage()
+    try:
+        if len(textpage.get_text_range().strip()) < min_chars:
+            return None
+        height = page.get_height()
+        rects: List[TextRect] = []
+        for i in range(textpage.count_rects()):
+            left, bottom, right, top = textpage.get_rect(i)
+            text = textpage.get_text_bounded(left, bottom, right, top)
+            if text.strip():
+                y0, y1 = (height - top) * scale, (height - bottom) * scale
+                rects.append((left * scale, y0, right * scale, y1, text))
+    finally:
+        textpage.close()
+    lines = _merge_rects(rects)
+    boxes = [[(x0, y0), (x1, y0), (x1, y1), (x0, y1)] for x0, y0, x1, y1, _ in lines]
+    return heur.Page(
+        np.asarray(boxes, dtype=np.float32).reshape(-1, 4, 2),
+        [line[4] for line in lines],
+        np.ones(len(lines), dtype=np.float32),
+    )
+
+
+def load_page(pdf: Any, index: int, dpi: int, max_side: Optional[int], min_text_chars: int = 0) -> PageInput:
+    """Render page ``index`` to a grayscale ``uint8`` ``(H, W)`` array and close the page.
+
+    Unrotated pages with at least ``min_text_chars`` embedded characters are
+    returned as a ``TextPage`` instead.
+    """
+    page = pdf[index]
+    try:
+        scale = _render_scale(page, dpi, max_side)
+        if min_text_chars and page.get_rotation() == 0:
+            lines = _text_layer(page, scale, min_text_chars)
+            if lines is not None:
+                width, height = page.get_size()
+                return TextPage(lines, (math.ceil(width * scale), math.ceil(height * scale)))
+        return page.render(scale=scale, grayscale=True).to_numpy()[:, :, 0]
+    finally:
+        page.close()
+
+
+def render_page(index: int, dpi: int, max_side: Optional[int], min_text_chars: int) -> PageInput:
+    """Load one page of the worker's document."""
+    return load_page(_WORKER_PDF, index, dpi, max_side, min_text_chars)